@@ -4,7 +4,6 @@ from __future__ import print_function, unicode_literals
 import codecs
 import os
 import os.path
-import re
 from sqlite3 import OperationalError
 import threading
 import time
@@ -14,6 +13,7 @@ from flask import Flask
 from watchdog.events import FileSystemEvent
 from watchdog.observers.polling import PollingObserver
 
+from analytics import Analytics
 from db import DB
 from event import Event, EventHandler
 from stats import Stats
@@ -29,10 +29,13 @@ class DFDash:
         def run(self):
             self._app.run()
 
-    def __init__(self, df, port=8080, db=None, limit=None):
+    def __init__(self, df, port=8080, db=None, limit=None, compress=False,
+                 analytics=False):
         """
         :type df: unicode
         :type port: int
+        :type compress: bool
+        :type analytics: bool
         """
         self.df = df
         self.port = port
@@ -44,11 +47,19 @@ class DFDash:
         self._observer = PollingObserver()
 
         self._db_lock = threading.Lock()
+        self._db_compress = compress
         self._db_path = db or os.path.join(self.df, DFDash.DB_NAME)
         if not os.path.exists(os.path.dirname(self._db_path)):
             os.makedirs(os.path.dirname(self._db_path))
         self.connect_db().ensure_db_initialized()
 
+        self.analytics = None
+        self._pending_events = []
+        if analytics:
+            db = self.connect_db()
+            self.analytics = Analytics.load(db)
+            db.close()
+
         self._log_file = None
         self.open_log_file()
 
@@ -87,13 +98,20 @@ class DFDash:
         offset = self._log_offset
         print("Storing log file offset: {}k".format(offset/1024))
         db.config_put("gamelog_seek", offset)
+        # config_put commits, so pending events are now in the db too
+        self._commit_pending_events()
+
+    def _commit_pending_events(self):
+        if self.analytics is not None:
+            self.analytics.extend(self._pending_events)
+        self._pending_events = []
 
     def stop_watching_log(self):
         self._observer.stop()
         self._observer.join()
 
     def connect_db(self):
-        db = DB(self._db_path)
+        db = DB(self._db_path, self._db_compress)
         try:
             db.execute("SELECT instr('foo', 'f')")
         except OperationalError as soe:
@@ -132,23 +150,13 @@ class DFDash:
         if event_type == "modified":
             self._on_log_change(db, print_events=True)
 
-    def _on_log_change(self, db, print_events=False):
-        last_line = None
-        while True:
-            line = self._log_file.readline()
-            line_length = len(line)
-            line = line.rstrip()
-            if line == "":
-                break
-            if re.match(r'^x[0-9]+$', line):
-                if last_line is None:
-                    print("Got line '{}' but last_line is None :S".format(line))
-                    self.line_count += 1
-                    self._log_offset += line_length
-                    continue
-                else:
-                    #print("Got line '{}', repeating last line".format(line))
-                    line = last_line
+    def _read_log(self, db, print_events):
+        for line_length, raw_line, line in Event.read_lines(self._log_file):
+            if line is None:
+                print("Got line '{}' but last_line is None :S".format(raw_line))
+                self.line_count += 1
+                self._log_offset += line_length
+                continue
             events = Event.from_text(line)
             for event in events:
                 commit = False
@@ -157,7 +165,10 @@ class DFDash:
                 if self.line_count is not None and self.line_count % COMMIT_EVERY == 0:
                     commit = True
                 event.put(db, commit)
-            last_line = line
+                if self.analytics is not None:
+                    self._pending_events.append(event)
+                if commit:
+                    self._commit_pending_events()
             self.line_count += 1
             self._log_offset += line_length
             if self.line_count % COMMIT_EVERY == 0:
@@ -168,7 +179,16 @@ class DFDash:
                 self.store_seek(db)
                 raise UserWarning("Limit reached.")
         self.store_seek(db)
-        print("Death causes: {!r}".format(Stats.deaths(db)))
+
+    def _on_log_change(self, db, print_events=False):
+        try:
+            self._read_log(db, print_events)
+        except BaseException:
+            # uncommitted events were rolled back or never committed
+            self._pending_events = []
+            raise
+        stats_source = db if self.analytics is None else self.analytics
+        print("Death causes: {!r}".format(Stats.deaths(stats_source)))
 
 DF_PATH = r'\\BELGAER\Games\Dwarf Fortress\Dwarf Fortress 40_05 Starter Pack r2\Dwarf Fortress 0.40.05'
 DB_PATH = os.path.join(os.environ['APPDATA'], "DFDash", "dfdash.db")
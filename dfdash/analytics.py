@@ -0,0 +1,290 @@
+from __future__ import unicode_literals
+
+import array
+import collections
+import threading
+import time
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from event import Event
+
+
+class Analytics:
+    """
+    Column-oriented in-memory copy of the events table. Each event is stored
+    as integer codes in the type, killer and timestamp columns. Each type is
+    classified once, when first seen, into integer death cause, body part
+    and attacker codes, so aggregates are bincounts over arrays rather than
+    SQLite queries. Uses NumPy when it is installed.
+    """
+    INJURY_EXCLUDE = ("death", "caught_in", "inhaled")
+    ATTACKS = ("bashes", "gouges", "kicks", "punches", "pushes", "strikes",
+               "bites", "scratches", "shakes", "stings", "snatches at",
+               "charge", "collide", "shot_web", "cloud")
+    WRESTLING_ATTACKS = ("grab", "latched_on", "throw", "take_down", "choke",
+                         "strangle", "lock")
+
+    @classmethod
+    def load(cls, db):
+        """
+        :type db: DFDash.DB
+        :rtype DFDash.Analytics
+        """
+        analytics = cls()
+        for row in db.iterate(b"SELECT * FROM events ORDER BY id"):
+            analytics._append(Event.from_row(row, db))
+        return analytics
+
+    @staticmethod
+    def _is_attack(segments):
+        """
+        Whether a type is the mob in segments[1] attacking, as opposed to
+        missing, dodging, deflecting or being thrown about.
+
+        :type segments: tuple[unicode]
+        :rtype bool
+        """
+        if segments[0] != "mob" or segments[2:3] != ("combat",):
+            return False
+        if segments[3:4] == ("wrestling",):
+            return (segments[-1] != "release" and any(
+                action in Analytics.WRESTLING_ATTACKS
+                for action in segments[4:6]))
+        # either combat.<attack>... or combat.<weapon>.<attack>...
+        return any(action in Analytics.ATTACKS for action in segments[3:5])
+
+    @staticmethod
+    def _intern(codes, values, value):
+        """
+        :type codes: dict[unicode, int]
+        :type values: list[unicode]
+        :type value: unicode | None
+        :rtype int
+        :return: code for value, or -1 for None
+        """
+        if value is None:
+            return -1
+        try:
+            return codes[value]
+        except KeyError:
+            code = len(values)
+            codes[value] = code
+            values.append(value)
+            return code
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # one entry per event
+        self._types = array.array(b"l")
+        self._killers = array.array(b"l")
+        self._timestamps = array.array(b"l")
+        # one entry per type code, -1 where not applicable
+        self._type_codes = {}
+        self._type_mappings = []
+        self._type_death_causes = array.array(b"l")
+        self._type_body_parts = array.array(b"l")
+        self._type_attackers = array.array(b"l")
+        self._murder_types = set()
+        self._death_cause_codes = {}
+        self._death_causes = []
+        self._body_part_codes = {}
+        self._body_parts = []
+        self._name_codes = {}
+        self._names = []
+
+    def __len__(self):
+        return len(self._types)
+
+    def extend(self, events):
+        """
+        Append events as they are committed by the writer.
+
+        :type events: list[DFDash.Event]
+        """
+        with self._lock:
+            for event in events:
+                self._append(event)
+
+    def _add_type(self, event):
+        """
+        Classify a new event type from its segments.
+
+        :type event: DFDash.Event
+        :rtype int
+        """
+        segments = event.segments
+        death_cause = body_part = attacker = None
+        if segments[0] == "mob":
+            if segments[2:4] == ("health", "death"):
+                if segments[4:] != ("butchered",):
+                    death_cause = ".".join(segments[4:])
+            elif (segments[2] == "health" and len(segments) >= 5
+                    and segments[3] not in Analytics.INJURY_EXCLUDE):
+                # mob.<name>.health.<body_part>.<...>; shorter health
+                # types (sick, vomits, ...) are statuses
+                body_part = segments[3]
+            elif Analytics._is_attack(segments):
+                attacker = segments[1]
+        type_code = len(self._type_mappings)
+        self._type_codes[event.event_type] = type_code
+        self._type_mappings.append(event.mapping_index)
+        self._type_death_causes.append(self._intern(
+            self._death_cause_codes, self._death_causes, death_cause))
+        self._type_body_parts.append(self._intern(
+            self._body_part_codes, self._body_parts, body_part))
+        self._type_attackers.append(self._intern(
+            self._name_codes, self._names, attacker))
+        if death_cause == "murder":
+            self._murder_types.add(type_code)
+        return type_code
+
+    def _append(self, event):
+        """
+        :type event: DFDash.Event
+        """
+        try:
+            type_code = self._type_codes[event.event_type]
+        except KeyError:
+            type_code = self._add_type(event)
+        killer = None
+        if type_code in self._murder_types:
+            if event.mapping_index is None:
+                # saves a raw row re-matching every mapping
+                event.mapping_index = self._type_mappings[type_code]
+            killer = event.group("killer")
+        timestamp = event.timestamp
+        if timestamp is None:
+            timestamp = int(time.time())
+        self._types.append(type_code)
+        self._killers.append(
+            self._intern(self._name_codes, self._names, killer))
+        self._timestamps.append(timestamp)
+
+    def _count(self, column, size):
+        """
+        Count occurrences of each code in column. Negative codes are not
+        counted.
+
+        :type column: array.array
+        :type size: int
+        :rtype list[int]
+        """
+        if numpy is not None:
+            if not len(column):
+                return [0] * size
+            values = numpy.frombuffer(column, dtype=column.typecode)
+            return numpy.bincount(values[values >= 0],
+                                  minlength=size).tolist()
+        counts = [0] * size
+        for value in column:
+            if value >= 0:
+                counts[value] += 1
+        return counts
+
+    def _count_by_type(self, type_column, size):
+        """
+        Count events by a per-type code, e.g. each type's death cause.
+
+        :type type_column: array.array
+        :type size: int
+        :rtype list[int]
+        """
+        if numpy is not None:
+            if not len(self._types):
+                return [0] * size
+            type_counts = numpy.bincount(
+                numpy.frombuffer(self._types, dtype=self._types.typecode),
+                minlength=len(type_column))
+            codes = numpy.frombuffer(type_column, dtype=type_column.typecode)
+            applicable = codes >= 0
+            return numpy.bincount(
+                codes[applicable], weights=type_counts[applicable],
+                minlength=size).astype(int).tolist()
+        counts = [0] * size
+        for type_code in self._types:
+            code = type_column[type_code]
+            if code >= 0:
+                counts[code] += 1
+        return counts
+
+    @staticmethod
+    def _ranked(values, counts, limit):
+        """
+        :type values: list[unicode]
+        :type counts: list[int]
+        :type limit: int
+        :rtype list[(unicode, int)]
+        """
+        ranked = [(values[code], count)
+                  for code, count in enumerate(counts) if count]
+        ranked.sort(key=lambda (value, count): count, reverse=True)
+        return ranked[:limit]
+
+    def deaths(self):
+        """
+        :rtype dict[unicode, int]
+        """
+        with self._lock:
+            counts = self._count_by_type(self._type_death_causes,
+                                         len(self._death_causes))
+            return dict((self._death_causes[code], count)
+                        for code, count in enumerate(counts) if count)
+
+    def injuries(self):
+        """
+        Injuries by body part.
+
+        :rtype dict[unicode, int]
+        """
+        with self._lock:
+            counts = self._count_by_type(self._type_body_parts,
+                                         len(self._body_parts))
+            return dict((self._body_parts[code], count)
+                        for code, count in enumerate(counts) if count)
+
+    def attackers(self, limit=10):
+        """
+        Mobs with the most attacks, most first.
+
+        :type limit: int
+        :rtype list[(unicode, int)]
+        """
+        with self._lock:
+            counts = self._count_by_type(self._type_attackers,
+                                         len(self._names))
+            return self._ranked(self._names, counts, limit)
+
+    def killers(self, limit=10):
+        """
+        Mobs with the most murders, most first. Other deaths don't name
+        a killer.
+
+        :type limit: int
+        :rtype list[(unicode, int)]
+        """
+        with self._lock:
+            counts = self._count(self._killers, len(self._names))
+            return self._ranked(self._names, counts, limit)
+
+    def events_per_minute(self):
+        """
+        Event counts keyed by the timestamp of the start of each minute.
+
+        :rtype dict[int, int]
+        """
+        with self._lock:
+            if not len(self._timestamps):
+                return {}
+            if numpy is not None:
+                minutes, counts = numpy.unique(
+                    numpy.frombuffer(self._timestamps,
+                                     dtype=self._timestamps.typecode) // 60,
+                    return_counts=True)
+                return dict(zip((minutes * 60).tolist(), counts.tolist()))
+            counts = collections.Counter(
+                timestamp // 60 * 60 for timestamp in self._timestamps)
+        return dict(counts)
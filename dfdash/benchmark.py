@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+"""
+Compare raw and template-compressed event storage on a gamelog:
+
+    python benchmark.py path/to/gamelog.txt [repeat]
+
+Each format is loaded repeat times (default 5) and the median is reported,
+both for the whole load and for the writes alone (Event.put and the final
+commit), since parsing takes the same time in either format.
+"""
+from __future__ import print_function, unicode_literals
+
+import codecs
+import os
+import os.path
+import shutil
+import sys
+import tempfile
+import time
+
+from db import DB
+from event import Event
+
+
+def load(log_path, db_path, compress):
+    """
+    :type log_path: unicode
+    :type db_path: unicode
+    :type compress: bool
+    :rtype (list[(unicode, unicode, unicode)], float, float)
+    """
+    db = DB(db_path, compress)
+    db.ensure_db_initialized()
+    events = []
+    writing = 0.0
+    started = time.time()
+    with codecs.open(log_path, "r", "cp437") as log_file:
+        for line_length, raw_line, line in Event.read_lines(log_file):
+            if line is None:
+                continue
+            for event in Event.from_text(line):
+                put_started = time.time()
+                event.put(db)
+                writing += time.time() - put_started
+                events.append((event.origin, event.message, event.event_type))
+    commit_started = time.time()
+    db.commit()
+    finished = time.time()
+    writing += finished - commit_started
+    db.close()
+    return events, finished - started, writing
+
+
+def median(values):
+    """
+    :type values: list[float]
+    :rtype float
+    """
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2
+
+
+def main(log_path, repeat=5):
+    directory = tempfile.mkdtemp()
+    try:
+        results = {}
+        for compress in (False, True):
+            timings = []
+            write_timings = []
+            for run in range(repeat):
+                db_path = os.path.join(
+                    directory, "{}-{}.db".format(compress, run))
+                events, elapsed, writing = load(log_path, db_path, compress)
+                timings.append(elapsed)
+                write_timings.append(writing)
+            db = DB(db_path, compress)
+            stored = [(event.origin, event.message, event.event_type)
+                      for event in Event.fetch(db)]
+            db.close()
+            if stored != events:
+                raise AssertionError(
+                    "Round trip failed with compress={}".format(compress))
+            elapsed = median(timings)
+            writing = median(write_timings)
+            results[compress] = (os.path.getsize(db_path), elapsed, writing)
+            print("compress={}: {} events, {}k, median {:.2f}s over {} runs "
+                  "({:.0f} events/s, min {:.2f}s, max {:.2f}s), "
+                  "writes {:.3f}s ({:.0f} events/s)"
+                  .format(compress, len(events), results[compress][0] / 1024,
+                          elapsed, repeat, len(events) / max(elapsed, 1e-9),
+                          min(timings), max(timings), writing,
+                          len(events) / max(writing, 1e-9)))
+        print("Size ratio: {:.2f}x, median insert rate ratio: {:.2f}x, "
+              "median write rate ratio: {:.2f}x".format(
+                  float(results[False][0]) / results[True][0],
+                  results[False][1] / max(results[True][1], 1e-9),
+                  results[False][2] / max(results[True][2], 1e-9)))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2:
+        main(sys.argv[1], int(sys.argv[2]))
+    else:
+        main(sys.argv[1])
@@ -7,33 +7,60 @@ class DB:
         timestamp INTEGER DEFAULT CURRENT_TIMESTAMP,
         type TEXT,
         message TEXT,
-        json TEXT
+        json TEXT,
+        template_id INTEGER,
+        arguments TEXT
     );
     CREATE INDEX IF NOT EXISTS `idx_type` ON `events` (`type`);
     CREATE INDEX IF NOT EXISTS `idx_message` ON `events` (`message`);
 
+    CREATE TABLE IF NOT EXISTS `templates` (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        mapping INTEGER,
+        template TEXT,
+        groups TEXT,
+        UNIQUE (mapping, template)
+    );
+
+    CREATE TABLE IF NOT EXISTS `strings` (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        value TEXT UNIQUE
+    );
+
     CREATE TABLE IF NOT EXISTS `dfdash_config` (
         key TEXT PRIMARY KEY,
         value TEXT
     );
     """
 
-    def __init__(self, db_path):
+    def __init__(self, db_path, compress=False):
         """
         :type db_path: unicode
+        :type compress: bool
         """
         self._path = db_path
         self._db = sqlite3.connect(db_path)
         self._db.row_factory = sqlite3.Row
+        self.compress = compress
+        self._reset_intern_caches()
 
     def ensure_db_initialized(self):
         try:
             self.execute(b"SELECT * FROM events LIMIT 1")
             self.execute(b"SELECT * FROM dfdash_config LIMIT 1")
+            self.execute(b"SELECT * FROM templates LIMIT 1")
+            self.execute(b"SELECT * FROM strings LIMIT 1")
         except sqlite3.OperationalError:
             self._db.executescript(DB.SCHEMA)
             self.execute(b"SELECT * FROM events LIMIT 1")
             self.execute(b"SELECT * FROM dfdash_config LIMIT 1")
+        try:
+            self.execute(b"SELECT template_id, arguments FROM events LIMIT 1")
+        except sqlite3.OperationalError:
+            # events table predates compressed storage
+            self.execute(b"ALTER TABLE events ADD COLUMN template_id INTEGER")
+            self.execute(b"ALTER TABLE events ADD COLUMN arguments TEXT",
+                         commit=True)
 
     def execute(self, query, parameters=None, commit=False):
         """
@@ -52,10 +79,53 @@ class DB:
             return cursor.rowcount
         except sqlite3.Error:
             self._db.rollback()
+            # interned rows may have been rolled back with the transaction
+            self._reset_intern_caches()
+            raise
+        finally:
+            cursor.close()
+
+    def iterate(self, query, parameters=None):
+        """
+        Yield rows one at a time instead of fetching them all.
+
+        :type query: str | unicode
+        :type parameters: tuple | dict
+        :rtype collections.Iterable[sqlite3.Row]
+        """
+        cursor = self._db.cursor()
+        try:
+            for row in cursor.execute(query, parameters or ()):
+                yield row
+        finally:
+            cursor.close()
+
+    def insert(self, query, parameters=None, commit=False):
+        """
+        :type query: str | unicode
+        :type parameters: tuple | dict
+        :rtype int | None
+        :return: id of the inserted row, or None if no row was inserted
+        """
+        cursor = self._db.cursor()
+        parameters = parameters or ()
+        try:
+            cursor.execute(query, parameters)
+            if commit:
+                self._db.commit()
+            if cursor.rowcount < 1:
+                return None
+            return cursor.lastrowid
+        except sqlite3.Error:
+            self._db.rollback()
+            self._reset_intern_caches()
             raise
         finally:
             cursor.close()
 
+    def commit(self):
+        self._db.commit()
+
     def close(self):
         self._db.close()
 
@@ -74,3 +144,88 @@ class DB:
             return value[b"value"]
         except IndexError:
             return None
+
+    def _reset_intern_caches(self):
+        self._string_ids = {}
+        self._strings = {}
+        self._template_ids = {}
+        self._templates = {}
+
+    def intern_string(self, value):
+        """
+        :type value: unicode
+        :rtype: int
+        """
+        try:
+            return self._string_ids[value]
+        except KeyError:
+            pass
+        string_id = self.insert(
+            b"INSERT OR IGNORE INTO `strings` (value) VALUES (?)", (value,))
+        if string_id is None:
+            # interned by an earlier connection
+            string_id = self.execute(
+                b"SELECT `id` FROM `strings` WHERE `value` = ?", (value,)
+            )[0][b"id"]
+        self._string_ids[value] = string_id
+        self._strings[string_id] = value
+        return string_id
+
+    def string(self, string_id):
+        """
+        :type string_id: int
+        :rtype: unicode
+        """
+        try:
+            return self._strings[string_id]
+        except KeyError:
+            pass
+        value = self.execute(
+            b"SELECT `value` FROM `strings` WHERE `id` = ?", (string_id,)
+        )[0][b"value"]
+        self._strings[string_id] = value
+        self._string_ids[value] = string_id
+        return value
+
+    def intern_template(self, mapping, template, groups):
+        """
+        :type mapping: int
+        :type template: unicode
+        :type groups: list[unicode]
+        :rtype: int
+        """
+        try:
+            return self._template_ids[(mapping, template)]
+        except KeyError:
+            pass
+        template_id = self.insert(
+            b"INSERT OR IGNORE INTO `templates` (mapping, template, groups) VALUES (?, ?, ?)",
+            (mapping, template, ",".join(groups)))
+        if template_id is None:
+            # interned by an earlier connection
+            template_id = self.execute(
+                b"SELECT `id` FROM `templates` WHERE `mapping` = ? AND `template` = ?",
+                (mapping, template)
+            )[0][b"id"]
+        self._template_ids[(mapping, template)] = template_id
+        self._templates[template_id] = (mapping, template, groups)
+        return template_id
+
+    def template(self, template_id):
+        """
+        :type template_id: int
+        :rtype: (int, unicode, list[unicode])
+        """
+        try:
+            return self._templates[template_id]
+        except KeyError:
+            pass
+        row = self.execute(
+            b"SELECT `mapping`, `template`, `groups` FROM `templates` WHERE `id` = ?",
+            (template_id,)
+        )[0]
+        groups = row[b"groups"].split(",") if row[b"groups"] else []
+        template = (row[b"mapping"], row[b"template"], groups)
+        self._templates[template_id] = template
+        self._template_ids[(row[b"mapping"], row[b"template"])] = template_id
+        return template
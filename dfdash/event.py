@@ -1,7 +1,11 @@
+import calendar
 import functools
 import json
 import threading
 import re
+import sre_constants
+import sre_parse
+import time
 from watchdog.events import FileSystemEventHandler
 
 from event_mappings import EVENT_MAPPINGS, EVENT_IGNORE
@@ -22,6 +26,35 @@ class EventHandler(FileSystemEventHandler):
 
 
 class Event:
+    REPEAT_LINE = re.compile(r'^x[0-9]+$')
+    _OUTER_GROUPS = {}
+
+    @classmethod
+    def read_lines(cls, log_file):
+        """
+        Read gamelog lines up to the first blank line, replacing each xN
+        marker with the line it repeats.
+
+        :type log_file: codecs.StreamReaderWriter
+        :rtype collections.Iterable[(int, unicode, unicode | None)]
+        :return: length read, the line as read, and the line to parse (None
+            for a marker with no earlier line to repeat)
+        """
+        last_line = None
+        while True:
+            raw_line = log_file.readline()
+            line_length = len(raw_line)
+            raw_line = raw_line.rstrip()
+            if raw_line == "":
+                return
+            line = raw_line
+            if cls.REPEAT_LINE.match(raw_line):
+                #print("Got line '{}', repeating last line".format(raw_line))
+                line = last_line
+            yield line_length, raw_line, line
+            if line is not None:
+                last_line = line
+
     @classmethod
     def from_text(cls, event_line):
         """
@@ -29,8 +62,9 @@ class Event:
         :rtype list[DFDash.Event]
         """
 
-        def extract_events(text, mapping):
+        def extract_events(text, (mapping_index, mapping)):
             """
+            :type mapping_index: int
             :type mapping: EventMapping
             """
             maybe_events = []
@@ -40,7 +74,8 @@ class Event:
                     types = mapping.types
                     if not isinstance(types, (list, tuple)):
                         types = [types, ]
-                    for event_type in types:
+                    for type_template in types:
+                        event_type = type_template
                         try:
                             origin = matches.group('origin')
                             event_type = matches.expand(event_type)
@@ -55,7 +90,9 @@ class Event:
                             raise
                         maybe_events.append(
                             cls(origin=origin, message=text,
-                                event_type=event_type))
+                                event_type=event_type,
+                                mapping_index=mapping_index, match=matches,
+                                type_template=type_template))
             except Exception:
                 print("Error testing regex:")
                 print(mapping.pattern.pattern)
@@ -66,7 +103,7 @@ class Event:
         events = []
         for maybe_events in map(
                 functools.partial(extract_events, event_line),
-                EVENT_MAPPINGS):
+                enumerate(EVENT_MAPPINGS)):
             if maybe_events is not None:
                 for event in maybe_events:
                     events.append(event)
@@ -84,24 +121,245 @@ class Event:
         # raise Exception("Unhandled event: {}".format(event_line))
         return [cls.unknown_event(event_line)]
 
-    def __init__(self, origin, message, event_type):
+    @classmethod
+    def from_row(cls, row, db):
+        """
+        :type row: sqlite3.Row
+        :type db: DFDash.DB
+        :rtype DFDash.Event
+        """
+        timestamp = cls._parse_timestamp(row[b"timestamp"])
+        if row[b"template_id"] is None:
+            return cls(origin=json.loads(row[b"json"])["origin"],
+                       message=row[b"message"], event_type=row[b"type"],
+                       timestamp=timestamp)
+        mapping_index, template, groups = db.template(row[b"template_id"])
+        if row[b"arguments"]:
+            arguments = [db.string(int(string_id))
+                         for string_id in row[b"arguments"].split(",")]
+        else:
+            arguments = []
+        try:
+            origin = arguments[groups.index("origin")]
+        except ValueError:
+            origin = "unknown"
+        return cls(origin=origin, message=template % tuple(arguments),
+                   event_type=row[b"type"], mapping_index=mapping_index,
+                   timestamp=timestamp)
+
+    @staticmethod
+    def _parse_timestamp(timestamp):
+        """
+        :type timestamp: unicode | int | None
+        :rtype int | None
+        """
+        if timestamp is None:
+            return None
+        try:
+            return int(timestamp)
+        except ValueError:
+            return calendar.timegm(
+                time.strptime(timestamp, "%Y-%m-%d %H:%M:%S"))
+
+    @staticmethod
+    def _expand(matches, type_template):
+        """
+        :type matches: re.MatchObject
+        :type type_template: unicode
+        :rtype unicode
+        """
+        try:
+            return matches.expand(type_template)
+        except IndexError:
+            return matches.expand(
+                re.sub('\\\\g<origin>', "unknown", type_template))
+
+    @classmethod
+    def fetch(cls, db, limit=None):
+        """
+        :type db: DFDash.DB
+        :type limit: int
+        :rtype list[DFDash.Event]
+        """
+        query = b"SELECT * FROM events ORDER BY id"
+        parameters = ()
+        if limit is not None:
+            query += b" LIMIT ?"
+            parameters = (limit,)
+        return [cls.from_row(row, db) for row in db.execute(query, parameters)]
+
+    def __init__(self, origin, message, event_type, mapping_index=None,
+                 match=None, type_template=None, timestamp=None):
         """
         :type origin: unicode
         :type message: unicode
         :type event_type: unicode
+        :type mapping_index: int
+        :type match: re.MatchObject
+        :type type_template: unicode
+        :type timestamp: int
         """
         self.origin = origin
         self.message = message
         self.event_type = event_type
+        self.mapping_index = mapping_index
+        self.timestamp = timestamp
+        self._match = match
+        self._type_template = type_template
+        self._template = None
+        self._segments = None
+
+    def _find_source(self):
+        """
+        Recover the match and type template that produced an event read
+        back from the db, by re-matching its mapping (or every mapping, for
+        raw rows) against the message.
+        """
+        if self._type_template is not None or self.event_type == "_.unknown":
+            return
+        if self.mapping_index is None:
+            candidates = enumerate(EVENT_MAPPINGS)
+        else:
+            candidates = [(self.mapping_index,
+                           EVENT_MAPPINGS[self.mapping_index])]
+        for mapping_index, mapping in candidates:
+            matches = mapping.pattern.match(self.message)
+            if not matches:
+                continue
+            types = mapping.types
+            if not isinstance(types, (list, tuple)):
+                types = [types, ]
+            for type_template in types:
+                try:
+                    event_type = self._expand(matches, type_template)
+                except (IndexError, re.error):
+                    continue
+                if event_type == self.event_type:
+                    self.mapping_index = mapping_index
+                    self._match = matches
+                    self._type_template = type_template
+                    return
+
+    @property
+    def segments(self):
+        """
+        The event type split on '.', expanded one template segment at a
+        time so captured names containing dots stay in one segment.
+
+        :rtype tuple[unicode]
+        """
+        if self._segments is None:
+            self._find_source()
+            if self._type_template is None:
+                self._segments = tuple(self.event_type.split("."))
+            else:
+                self._segments = tuple(
+                    self._expand(self._match, segment)
+                    for segment in self._type_template.split("."))
+        return self._segments
+
+    def group(self, name):
+        """
+        The value captured by a named group of the event's mapping, or None.
+
+        :type name: unicode
+        :rtype unicode | None
+        """
+        self._find_source()
+        if self._match is None or name not in self._match.re.groupindex:
+            return None
+        return self._match.group(name)
+
+    @classmethod
+    def _outer_groups(cls, pattern):
+        """
+        Index and name ("" if unnamed) of each capturing group in pattern
+        that isn't nested in another capturing group, in pattern order.
+
+        :type pattern: re.RegexObject
+        :rtype list[(int, unicode)]
+        """
+        try:
+            return cls._OUTER_GROUPS[pattern]
+        except KeyError:
+            pass
+        names = dict((index, name)
+                     for name, index in pattern.groupindex.items())
+        groups = []
+
+        def walk(items):
+            for op, av in items:
+                if op == sre_constants.SUBPATTERN:
+                    if av[0] is None:
+                        walk(av[-1])
+                    else:
+                        groups.append((av[0], names.get(av[0], "")))
+                elif op in (sre_constants.MAX_REPEAT,
+                            sre_constants.MIN_REPEAT):
+                    walk(av[2])
+                elif op == sre_constants.BRANCH:
+                    for branch in av[1]:
+                        walk(branch)
+
+        walk(sre_parse.parse(pattern.pattern, pattern.flags))
+        cls._OUTER_GROUPS[pattern] = groups
+        return groups
+
+    @property
+    def template(self):
+        """
+        The message with each outermost captured group replaced by a %s
+        placeholder, along with the group names and captured arguments.
+
+        :rtype (unicode, list[unicode], list[unicode]) | None
+        """
+        if self._match is None:
+            return None
+        if self._template is None:
+            match = self._match
+            message = self.message
+            literals = []
+            groups = []
+            arguments = []
+            position = 0
+            for index, name in self._outer_groups(match.re):
+                start, end = match.span(index)
+                if start == -1:
+                    continue
+                literals.append(message[position:start])
+                groups.append(name)
+                arguments.append(message[start:end])
+                position = end
+            literals.append(message[position:])
+            if "%" in message:
+                literals = [literal.replace("%", "%%") for literal in literals]
+            self._template = ("%s".join(literals), groups, arguments)
+        return self._template
 
     def put(self, db, commit=False):
         """
         :type db: DFDash.DB
         """
+        if self.timestamp is None:
+            self.timestamp = int(time.time())
+        # same format as CURRENT_TIMESTAMP, so rows read back match
+        timestamp = time.strftime("%Y-%m-%d %H:%M:%S",
+                                  time.gmtime(self.timestamp))
+        template = self.template if db.compress else None
+        if template is not None:
+            template, groups, arguments = template
+            template_id = db.intern_template(
+                self.mapping_index, template, groups)
+            return db.execute(
+                b"INSERT INTO events (timestamp, type, template_id, arguments) VALUES (?, ?, ?, ?)",
+                (timestamp, self.event_type, template_id,
+                 ",".join(str(db.intern_string(argument))
+                          for argument in arguments)),
+                commit)
         return db.execute(
-            b"INSERT INTO events (message, type, json) VALUES (?, ?, ?)",
+            b"INSERT INTO events (timestamp, message, type, json) VALUES (?, ?, ?, ?)",
             # ("", self.event_type, ""),
-            (self.message, self.event_type, self.json),
+            (timestamp, self.message, self.event_type, self.json),
             commit)
 
     @property
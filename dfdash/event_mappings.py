@@ -134,7 +134,7 @@ EVENT_MAPPINGS = map(
              ["mob.\g<origin>.combat.\g<weapon>.\g<attack>.\g<target>.\g<body_part>",
               "mob.\g<origin>.combat.miss.\g<target>.glanced_away"]),
         # deflected
-        ("(?P<origin>.+) (?P<attack>(bashes|gouges|kicks|punches|pushes|strikes)) (?P<target>.+) in the (?P<body_part>.+) with (his|her|its) (?P<weapon>.+), but the attack is deflected by .+'s (?P<armor>.+)!",
+        ("(?P<origin>.+) (?P<attack>(bashes|gouges|kicks|punches|pushes|strikes)) (?P<target>.+) in the (?P<body_part>.+) with (his|her|its) (?P<weapon>.+), but the attack is deflected by (?P<defender>.+)'s (?P<armor>.+)!",
          ["mob.\g<origin>.combat.\g<weapon>.\g<attack>.\g<target>.\g<body_part>",
           "mob.\g<target>.combat.\g<armor>.deflect.\g<origin>.\g<weapon>"]),
         # batted aside
@@ -231,7 +231,7 @@ EVENT_MAPPINGS = map(
         ("(?P<origin>.+) has been impaled on spikes\.", "mob.\g<origin>.health.death.spikes"),
         ("(?P<origin>.+) has killed by a flying object\.", "mob.\g<origin>.health.death.ufo_impact"),
         ("(?P<origin>.+) has been killed by a trap\.", "mob.\g<origin>.health.death.trap"),
-        ("(?P<origin>.+) has been murdered by (.+)!", "mob.\g<origin>.health.death.murder"),
+        ("(?P<origin>.+) has been murdered by (?P<killer>.+)!", "mob.\g<origin>.health.death.murder"),
         ("(?P<origin>.+) has been scared to death by the (.+)!", "mob.\g<origin>.health.death.fright"),
 
         # Death - Found
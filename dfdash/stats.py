@@ -1,6 +1,11 @@
+from analytics import Analytics
+
+
 class Stats:
     @staticmethod
     def deaths(db):
+        if isinstance(db, Analytics):
+            return db.deaths()
         query = """SELECT substr(type, instr(type, 'death.') + 6) as death_type, COUNT(*) as count
             FROM events
             WHERE type LIKE '%.death%'
@@ -12,4 +17,3 @@ class Stats:
         for row in rows:
             deaths[row['death_type']] = row['count']
         return deaths
-